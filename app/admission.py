@@ -0,0 +1,94 @@
+import math
+import time
+from typing import Callable, TypeVar
+
+import anyio
+from fastapi import HTTPException
+
+T = TypeVar("T")
+
+
+class AdmissionPool:
+    """Pool de capacidade limitado com controle de admissão.
+
+    Executa funções bloqueantes em threads, limitando quantas rodam ao mesmo
+    tempo e quantas podem aguardar na fila. Quando a fila está cheia a
+    requisição é rejeitada com 429 e um cabeçalho `Retry-After` estimado a
+    partir da duração média das execuções recentes.
+
+    A admissão conta as tarefas em `_active` sem nenhum `await` entre a
+    verificação e o incremento, de modo que uma rajada simultânea não passa toda
+    pela verificação antes de alguma tarefa chegar a aguardar no limiter.
+
+    Attributes:
+        name (str): Nome do pool, usado nas métricas.
+        max_queue_depth (int): Número máximo de tarefas aguardando na fila.
+        admitted (int): Total de tarefas admitidas.
+        rejected (int): Total de tarefas rejeitadas com 429.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queue_depth: int,
+                 smoothing: float = 0.2):
+        self.name = name
+        self.max_queue_depth = max_queue_depth
+        self.limiter = anyio.CapacityLimiter(max_concurrency)
+        self.admitted = 0
+        self.rejected = 0
+        self._active = 0
+        self._smoothing = smoothing
+        self._avg_duration = 1.0
+
+    @property
+    def in_flight(self) -> int:
+        return self.limiter.borrowed_tokens
+
+    @property
+    def queue_depth(self) -> int:
+        return self._active - self.in_flight
+
+    def is_saturated(self) -> bool:
+        return self._active >= self.limiter.total_tokens + self.max_queue_depth
+
+    def retry_after(self) -> int:
+        """Estima em segundos quando a fila terá espaço novamente."""
+        waves = (self.queue_depth + 1) / self.limiter.total_tokens
+        return max(1, math.ceil(waves * self._avg_duration))
+
+    async def run(self, func: Callable[..., T], *args) -> T:
+        """Executa `func(*args)` em uma thread do pool.
+
+        Raises:
+            HTTPException: Com código 429 se a fila estiver cheia.
+        """
+        if self.is_saturated():
+            self.rejected += 1
+            raise HTTPException(status_code=429,
+                                detail="Servidor sobrecarregado, tente novamente",
+                                headers={"Retry-After": str(self.retry_after())})
+        self.admitted += 1
+        self._active += 1
+        try:
+            return await anyio.to_thread.run_sync(self._timed, func, *args,
+                                                  limiter=self.limiter)
+        finally:
+            self._active -= 1
+
+    def _timed(self, func: Callable[..., T], *args) -> T:
+        # Mede apenas o tempo de execução, sem a espera na fila
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            self._avg_duration += self._smoothing * (elapsed - self._avg_duration)
+
+    def metrics(self) -> dict:
+        return {
+            "name": self.name,
+            "max_concurrency": int(self.limiter.total_tokens),
+            "max_queue_depth": self.max_queue_depth,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,46 @@
+import os
+
+# Concorrência máxima de inferências simultâneas do modelo de sentimento
+INFERENCE_MAX_CONCURRENCY = int(os.getenv("INFERENCE_MAX_CONCURRENCY", "2"))
+
+# Número máximo de requisições aguardando inferência antes de responder 429
+INFERENCE_MAX_QUEUE_DEPTH = int(os.getenv("INFERENCE_MAX_QUEUE_DEPTH", "8"))
+
+# Tamanho do pool de threads reservado para os endpoints de leitura
+READ_POOL_SIZE = int(os.getenv("READ_POOL_SIZE", "40"))
+
+# Perfilamento sob demanda das requisições (desativado por padrão)
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true")
+
+# Token esperado no cabeçalho `X-Profile` para perfilar uma requisição específica
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")
+
+# Fração das requisições perfiladas por amostragem (0.0 a 1.0)
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+
+# Intervalo entre amostras da pilha, em segundos
+PROFILING_INTERVAL = float(os.getenv("PROFILING_INTERVAL", "0.005"))
+
+# Diretório onde os arquivos speedscope/collapsed são gravados
+PROFILING_DIR = os.getenv("PROFILING_DIR", "profiles")
+
+# Número de eventos recentes mantidos em memória para retomar streams SSE
+SSE_HISTORY_SIZE = int(os.getenv("SSE_HISTORY_SIZE", "1000"))
+
+# Intervalo, em segundos, entre os eventos de variação da contagem de sentimentos
+SSE_COUNTS_INTERVAL = float(os.getenv("SSE_COUNTS_INTERVAL", "5"))
+
+# Intervalo, em segundos, entre comentários de keep-alive em streams ociosos
+SSE_KEEPALIVE_INTERVAL = float(os.getenv("SSE_KEEPALIVE_INTERVAL", "15"))
+
+# Avaliações buscadas por consulta ao banco ao retomar um stream antigo
+SSE_BACKFILL_LIMIT = int(os.getenv("SSE_BACKFILL_LIMIT", "1000"))
+
+# Diretório onde os embeddings das avaliações são gravados (memory-mapped)
+EMBEDDINGS_DIR = os.getenv("EMBEDDINGS_DIR", "embeddings")
+
+# Tamanho mínimo do corpus para usar o índice aproximado (IVF) em vez da busca exata
+EMBEDDINGS_IVF_MIN_SIZE = int(os.getenv("EMBEDDINGS_IVF_MIN_SIZE", "10000"))
+
+# Número de listas do índice IVF visitadas por consulta
+EMBEDDINGS_IVF_NPROBE = int(os.getenv("EMBEDDINGS_IVF_NPROBE", "8"))
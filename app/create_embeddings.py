@@ -0,0 +1,26 @@
+from app.db import SessionLocal
+from app.embeddings import EmbeddingIndex, EmbeddingStore
+from app.models import Review
+from app.sentiment_analyze import embed, embedding_dim
+
+
+def rebuild_embeddings():
+    # Recalcula os embeddings de todas as avaliações já gravadas no banco
+    index = EmbeddingIndex(EmbeddingStore(embedding_dim))
+    index.clear()
+    db = SessionLocal()
+    try:
+        reviews = db.query(Review.id, Review.review).order_by(Review.id)
+        for count, (review_id, text) in enumerate(reviews.yield_per(500), start=1):
+            index.add(review_id, embed(text))
+            if count % 500 == 0:
+                print(f"{count} embeddings calculados.")
+    finally:
+        db.close()
+    index.store.flush()
+    print(f"Embeddings de {len(index)} avaliações gravados em "
+          f"'{index.store.directory}'.")
+
+
+if __name__ == "__main__":
+    rebuild_embeddings()
@@ -0,0 +1,311 @@
+import os
+import threading
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from app.config import (EMBEDDINGS_DIR, EMBEDDINGS_IVF_MIN_SIZE,
+                        EMBEDDINGS_IVF_NPROBE)
+
+_CHUNK_ROWS = 65536
+
+
+class EmbeddingStore:
+    """Armazena os embeddings das avaliações em arquivos NumPy memory-mapped.
+
+    A linha `i` de `vectors.npy` guarda o embedding da avaliação com `Review.id`
+    igual a `i`, em float16, e `present.npy` indica quais linhas estão
+    preenchidas. Como os IDs são sequenciais o arquivo fica denso, e ele dobra de
+    capacidade quando um ID novo não cabe.
+
+    Suporta um único processo escrevendo: o aumento de capacidade substitui os
+    arquivos com `os.replace`, e outros processos continuariam mapeando (e
+    gravando em) os arquivos antigos.
+
+    Attributes:
+        dim (int): Dimensão dos embeddings.
+        directory (str): Diretório dos arquivos.
+    """
+
+    def __init__(self, dim: int, directory: str = EMBEDDINGS_DIR,
+                 initial_capacity: int = 1024):
+        self.dim = dim
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._vectors_path = os.path.join(directory, "vectors.npy")
+        self._present_path = os.path.join(directory, "present.npy")
+        if os.path.exists(self._vectors_path):
+            self.vectors = np.load(self._vectors_path, mmap_mode="r+")
+            self.present = np.load(self._present_path, mmap_mode="r+")
+            if self.vectors.shape[1] != dim:
+                raise ValueError(f"Embeddings em {directory} têm dimensão "
+                                 f"{self.vectors.shape[1]}, esperado {dim}")
+        else:
+            self._allocate(initial_capacity)
+
+    def _allocate(self, capacity: int):
+        old_vectors = getattr(self, "vectors", None)
+        old_present = getattr(self, "present", None)
+        vectors = np.lib.format.open_memmap(self._vectors_path + ".tmp", mode="w+",
+                                            dtype=np.float16,
+                                            shape=(capacity, self.dim))
+        present = np.lib.format.open_memmap(self._present_path + ".tmp", mode="w+",
+                                            dtype=np.bool_, shape=(capacity,))
+        if old_vectors is not None:
+            vectors[:len(old_vectors)] = old_vectors
+            present[:len(old_present)] = old_present
+        vectors.flush()
+        present.flush()
+        del old_vectors, old_present
+        self.vectors = self.present = None
+        os.replace(self._vectors_path + ".tmp", self._vectors_path)
+        os.replace(self._present_path + ".tmp", self._present_path)
+        self.vectors, self.present = vectors, present
+
+    @property
+    def capacity(self) -> int:
+        return len(self.present)
+
+    def put(self, review_id: int, vector: np.ndarray):
+        if review_id >= self.capacity:
+            self._allocate(max(self.capacity * 2, review_id + 1))
+        self.vectors[review_id] = vector
+        self.present[review_id] = True
+
+    def ids(self) -> np.ndarray:
+        return np.flatnonzero(self.present)
+
+    def clear(self):
+        self.present[:] = False
+        self.present.flush()
+
+    def flush(self):
+        self.vectors.flush()
+        self.present.flush()
+
+
+def _top_k(ids: np.ndarray, scores: np.ndarray, k: int) -> List[Tuple[int, float]]:
+    if len(ids) > k:
+        best = np.argpartition(-scores, k - 1)[:k]
+        ids, scores = ids[best], scores[best]
+    order = np.argsort(-scores)
+    return [(int(ids[i]), float(scores[i])) for i in order]
+
+
+class EmbeddingIndex:
+    """Busca por similaridade sobre os embeddings das avaliações.
+
+    Abaixo de `ivf_min_size` embeddings a busca é exata (produto interno com todo
+    o corpus, em blocos). A partir daí usa um índice IVF: os embeddings são
+    agrupados por k-means em ~sqrt(N) listas e a consulta compara apenas os
+    embeddings das `nprobe` listas cujos centróides estão mais próximos. Novas
+    avaliações entram na lista do centróide mais próximo, e o k-means é refeito
+    quando o corpus dobra de tamanho desde o último treino.
+
+    O k-means roda em uma thread em segundo plano: enquanto o primeiro treino não
+    termina as buscas são exatas, e durante um novo treino usam as listas
+    anteriores.
+
+    Attributes:
+        store (`EmbeddingStore`): Os embeddings armazenados.
+        nprobe (int): Número de listas visitadas por consulta.
+        ivf_min_size (int): Tamanho mínimo do corpus para usar o índice IVF.
+    """
+
+    def __init__(self, store: EmbeddingStore, nprobe: int = EMBEDDINGS_IVF_NPROBE,
+                 ivf_min_size: int = EMBEDDINGS_IVF_MIN_SIZE, seed: int = 0):
+        self.store = store
+        self.nprobe = nprobe
+        self.ivf_min_size = ivf_min_size
+        self._rng = np.random.default_rng(seed)
+        # Protege apenas as leituras e trocas de estado; o produto interno das
+        # buscas e o k-means rodam fora dele para não bloquear `add`
+        self._lock = threading.Lock()
+        self._centroids: Optional[np.ndarray] = None
+        self._lists: List[List[int]] = []
+        self._trained_size = 0
+        self._training = False
+        self._trainer: Optional[threading.Thread] = None
+        self._added_while_training: List[int] = []
+        self._generation = 0
+
+    def __len__(self) -> int:
+        return int(self.store.present.sum())
+
+    def add(self, review_id: int, vector: np.ndarray):
+        """Adiciona (ou substitui) o embedding de uma avaliação."""
+        with self._lock:
+            self.store.put(review_id, vector)
+            if self._centroids is not None:
+                nearest = int(np.argmax(self._centroids @ vector))
+                self._lists[nearest].append(review_id)
+            if self._training:
+                self._added_while_training.append(review_id)
+
+    def get(self, review_id: int) -> Optional[np.ndarray]:
+        """Retorna o embedding de uma avaliação, ou `None` se não existir."""
+        with self._lock:
+            if review_id >= self.store.capacity or not self.store.present[review_id]:
+                return None
+            return self.store.vectors[review_id].astype(np.float32)
+
+    def clear(self):
+        with self._lock:
+            self.store.clear()
+            self._centroids = None
+            self._lists = []
+            self._trained_size = 0
+            self._generation += 1
+
+    def search(self, vector: np.ndarray, k: int = 10, exact: bool = False,
+               exclude: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Retorna as `k` avaliações mais similares ao embedding informado.
+
+        Args:
+            vector (np.ndarray): Embedding de consulta, com norma 1.
+            k (int): Número de resultados.
+            exact (bool): Força a busca exata, ignorando o índice IVF.
+            exclude (Optional[int]): ID a ser ignorado nos resultados.
+
+        Returns:
+            List[Tuple[int, float]]: Pares `(review_id, similaridade)` em ordem
+            decrescente de similaridade.
+        """
+        vector = np.asarray(vector, dtype=np.float32)
+        fetch = k + (exclude is not None)
+        with self._lock:
+            ids, vectors = self.store.ids(), self.store.vectors
+            use_ivf = not exact and len(ids) >= self.ivf_min_size
+            if use_ivf:
+                self._start_training(ids, vectors)
+
+        candidates = self._ivf_candidates(vector) if use_ivf else None
+        if candidates is None:
+            results = _score(ids, vectors, vector, fetch)
+        else:
+            results = _score(*candidates, vector, fetch)
+        return [(i, s) for i, s in results if i != exclude][:k]
+
+    def maybe_train(self) -> bool:
+        """Inicia o treino do índice IVF em segundo plano, se necessário.
+
+        Returns:
+            bool: Se um treino foi iniciado.
+        """
+        with self._lock:
+            ids = self.store.ids()
+            if len(ids) < self.ivf_min_size:
+                return False
+            return self._start_training(ids, self.store.vectors)
+
+    def wait_for_training(self, timeout: Optional[float] = None) -> bool:
+        """Aguarda o treino em andamento, se houver.
+
+        Returns:
+            bool: Se não há mais treino em andamento.
+        """
+        trainer = self._trainer
+        if trainer is not None:
+            trainer.join(timeout)
+            return not trainer.is_alive()
+        return True
+
+    def _start_training(self, ids: np.ndarray, vectors: np.ndarray) -> bool:
+        # Chamado com `_lock` adquirido
+        if self._training or (self._centroids is not None
+                              and len(ids) < 2 * self._trained_size):
+            return False
+        self._training = True
+        self._added_while_training = []
+        self._trainer = threading.Thread(
+            target=self._train, args=(ids, vectors, self._generation),
+            name="ivf-train", daemon=True)
+        self._trainer.start()
+        return True
+
+    def _ivf_candidates(self, vector: np.ndarray
+                        ) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        # Sem índice treinado (o primeiro treino ainda não terminou) a busca é
+        # exata.
+        # O memmap é lido junto com as listas: se `add` aumentou o armazenamento
+        # depois do snapshot de `search`, as listas já têm IDs que não cabem nele
+        with self._lock:
+            centroids, lists = self._centroids, self._lists
+            if centroids is None:
+                return None
+            nprobe = min(self.nprobe, len(centroids))
+            probes = np.argpartition(-(centroids @ vector), nprobe - 1)[:nprobe]
+            candidates = [list(lists[p]) for p in probes]
+            vectors, present = self.store.vectors, self.store.present
+        ids = np.unique(np.concatenate(
+            [np.asarray(c, dtype=np.int64) for c in candidates]))
+        ids = ids[ids < len(present)]
+        return ids[present[ids]], vectors
+
+    def _train(self, ids: np.ndarray, vectors: np.ndarray, generation: int):
+        try:
+            centroids, lists = self._build(ids, vectors)
+            with self._lock:
+                if generation != self._generation:
+                    return
+                # Embeddings adicionados durante o treino ainda não estão nas
+                # novas listas
+                for review_id in self._added_while_training:
+                    nearest = int(np.argmax(
+                        centroids @ self.store.vectors[review_id].astype(np.float32)))
+                    lists[nearest].append(review_id)
+                self._centroids = centroids
+                self._lists = lists
+                self._trained_size = len(ids)
+        finally:
+            with self._lock:
+                self._training = False
+                self._added_while_training = []
+
+    def _build(self, ids: np.ndarray, vectors: np.ndarray, iterations: int = 10
+               ) -> Tuple[np.ndarray, List[List[int]]]:
+        nlist = max(1, min(4096, int(np.sqrt(len(ids)))))
+        sample = self._rng.choice(ids, size=min(len(ids), nlist * 64),
+                                  replace=False)
+        sample.sort()
+        data = vectors[sample].astype(np.float32)
+        centroids = data[self._rng.choice(len(data), size=nlist, replace=False)]
+        # k-means esférico: os embeddings são normalizados, então a atribuição
+        # usa o produto interno e os centróides são renormalizados a cada passo
+        for _ in range(iterations):
+            assignment = np.argmax(data @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, data)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            empty = norms[:, 0] == 0
+            sums[empty] = centroids[empty]
+            norms[empty] = 1
+            centroids = sums / norms
+
+        lists: List[List[int]] = [[] for _ in range(nlist)]
+        for start in range(0, len(ids), _CHUNK_ROWS):
+            chunk = ids[start:start + _CHUNK_ROWS]
+            block = vectors[chunk].astype(np.float32)
+            for review_id, nearest in zip(chunk.tolist(),
+                                          np.argmax(block @ centroids.T, axis=1)):
+                lists[nearest].append(review_id)
+        return centroids, lists
+
+
+def _score(ids: np.ndarray, vectors: np.ndarray, vector: np.ndarray,
+           k: int) -> List[Tuple[int, float]]:
+    # Produto interno em blocos, sobre um snapshot dos IDs e do memmap
+    if len(ids) == 0:
+        return []
+    scores = np.empty(len(ids), dtype=np.float32)
+    for start in range(0, len(ids), _CHUNK_ROWS):
+        chunk = ids[start:start + _CHUNK_ROWS]
+        span = chunk[-1] - chunk[0] + 1
+        if span <= 2 * len(chunk):
+            # IDs quase contíguos: ler a faixa inteira do memmap é mais rápido
+            block = vectors[chunk[0]:chunk[-1] + 1].astype(np.float32)
+            block = block[chunk - chunk[0]]
+        else:
+            block = vectors[chunk].astype(np.float32)
+        scores[start:start + len(chunk)] = block @ vector
+    return _top_k(ids, scores, k)
@@ -0,0 +1,175 @@
+import asyncio
+import itertools
+import json
+import uuid
+from collections import Counter, deque
+from typing import AsyncIterator, Callable, List, NamedTuple, Optional, Tuple
+
+import anyio
+
+from app.config import (SSE_BACKFILL_LIMIT, SSE_COUNTS_INTERVAL,
+                        SSE_HISTORY_SIZE, SSE_KEEPALIVE_INTERVAL)
+from app.schemas import ReviewResponse
+
+SENTIMENTS = ("positiva", "neutra", "negativa")
+
+# Marca no `id:` dos eventos enviados a partir do banco de dados
+_BACKFILL_SEQ = "b"
+
+
+class Event(NamedTuple):
+    seq: int
+    name: str
+    review_id: Optional[int]
+    data: str
+    # Maior ID de avaliação publicado até este evento, usado para retomar pelo
+    # banco de dados quando o evento já saiu do buffer
+    high_water: int
+
+    def encode(self, epoch: str) -> str:
+        """Formata o evento no formato `text/event-stream`."""
+        return (f"id: {epoch}-{self.seq}-{self.high_water}\n"
+                f"event: {self.name}\ndata: {self.data}\n\n")
+
+
+class ReviewBroadcaster:
+    """Distribui as avaliações recém-criadas para os streams SSE do processo.
+
+    Os eventos ficam em um buffer circular com número de sequência. Cada
+    assinante guarda apenas a última sequência lida e aguarda um único
+    `asyncio.Event` compartilhado, substituído a cada publicação, de modo que
+    assinantes ociosos não consomem nada além da própria corrotina.
+
+    O `id:` de cada evento é `<época>-<sequência>-<maior ID publicado>`. A época
+    muda a cada processo, então um cliente só retoma pelo buffer se a sequência
+    pertence a este processo e ainda está no buffer, independentemente da ordem
+    em que as avaliações foram publicadas. Caso contrário a retomada é feita
+    pelo banco de dados, a partir do maior ID publicado até o último evento
+    recebido. Eventos enviados a partir do banco usam `b` no lugar da sequência,
+    de modo que um cliente que desconecta no meio da recuperação continua pelo
+    banco ao reconectar.
+
+    Attributes:
+        subscribers (int): Número de streams conectados.
+    """
+
+    def __init__(self, history_size: int = SSE_HISTORY_SIZE):
+        self.subscribers = 0
+        self._events: deque = deque(maxlen=history_size)
+        self.epoch = uuid.uuid4().hex[:8]
+        self._seq = 0
+        self._high_water = 0
+        self._changed = asyncio.Event()
+        self._pending_counts: Counter = Counter()
+
+    def publish_review(self, review: ReviewResponse):
+        """Publica uma avaliação recém-criada. Deve rodar no event loop."""
+        self._pending_counts[review.sentiment] += 1
+        self._high_water = max(self._high_water, review.id)
+        self._append("review", review.id, review.model_dump_json())
+
+    def flush_counts(self):
+        """Publica a variação da contagem de sentimentos desde o último envio."""
+        if not self._pending_counts:
+            return
+        delta = {s: self._pending_counts.get(s, 0) for s in SENTIMENTS}
+        self._pending_counts.clear()
+        self._append("counts", None, json.dumps(delta))
+
+    async def publish_counts_periodically(self,
+                                          interval: float = SSE_COUNTS_INTERVAL):
+        while True:
+            await anyio.sleep(interval)
+            self.flush_counts()
+
+    def _append(self, name: str, review_id: Optional[int], data: str):
+        self._seq += 1
+        self._events.append(Event(self._seq, name, review_id, data,
+                                  self._high_water))
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def _events_after(self, seq: int) -> List[Event]:
+        missed = min(self._seq - seq, len(self._events))
+        return list(itertools.islice(reversed(self._events), missed))[::-1]
+
+    def _resume_point(self, last_event_id: Optional[str]
+                      ) -> Tuple[Optional[int], Optional[int]]:
+        """Interpreta o `Last-Event-ID` enviado pelo cliente.
+
+        Returns:
+            Tuple[Optional[int], Optional[int]]: A sequência a partir da qual o
+            buffer deve ser reenviado, se ele ainda a cobre, e o maior ID de
+            avaliação publicado até o último evento recebido.
+        """
+        try:
+            epoch, seq, high_water = (last_event_id or "").split("-")
+            high_water = int(high_water)
+            if seq == _BACKFILL_SEQ:
+                return None, high_water
+            seq = int(seq)
+        except ValueError:
+            return None, None
+        oldest = self._events[0].seq if self._events else self._seq + 1
+        if epoch == self.epoch and oldest - 1 <= seq <= self._seq:
+            return seq, high_water
+        return None, high_water
+
+    async def stream(self, last_event_id: Optional[str],
+                     last_review_id: Optional[int],
+                     backfill: Callable[[int, int], List[ReviewResponse]],
+                     keepalive: float = SSE_KEEPALIVE_INTERVAL,
+                     backfill_page: int = SSE_BACKFILL_LIMIT
+                     ) -> AsyncIterator[str]:
+        """Gera os eventos SSE de um assinante.
+
+        Args:
+            last_event_id (Optional[str]): O `id:` do último evento recebido pelo
+            cliente. Se ainda estiver no buffer, os eventos posteriores são
+            reenviados a partir dele; senão, as avaliações posteriores são
+            buscadas no banco de dados.
+            last_review_id (Optional[int]): ID da última avaliação recebida,
+            para retomar pelo banco quando não há `last_event_id`.
+            backfill (Callable): Função bloqueante `(last_id, limit)` que
+            retorna as avaliações com ID maior que `last_id`, em ordem.
+            keepalive (float): Intervalo entre comentários de keep-alive.
+            backfill_page (int): Avaliações buscadas por consulta ao banco. As
+            páginas são buscadas até uma vir incompleta; avaliações publicadas
+            enquanto isso e já enviadas pelo banco não são repetidas.
+        """
+        self.subscribers += 1
+        try:
+            seq = self._seq
+            yield "retry: 3000\n\n"
+            resume_seq, high_water = self._resume_point(last_event_id)
+            backfilled = set()
+            if resume_seq is not None:
+                seq = resume_seq
+            elif high_water is not None or last_review_id is not None:
+                cursor = high_water if high_water is not None else last_review_id
+                while True:
+                    reviews = await anyio.to_thread.run_sync(
+                        backfill, cursor, backfill_page)
+                    for review in reviews:
+                        backfilled.add(review.id)
+                        cursor = max(cursor, review.id)
+                        yield (f"id: {self.epoch}-{_BACKFILL_SEQ}-{cursor}\n"
+                               f"event: review\ndata: {review.model_dump_json()}"
+                               "\n\n")
+                    if len(reviews) < backfill_page:
+                        break
+            while True:
+                changed = self._changed
+                for event in self._events_after(seq):
+                    seq = event.seq
+                    # Avaliações publicadas durante a consulta ao banco podem já
+                    # ter sido enviadas por ela
+                    if event.review_id in backfilled:
+                        continue
+                    yield event.encode(self.epoch)
+                with anyio.move_on_after(keepalive) as scope:
+                    await changed.wait()
+                if scope.cancelled_caught:
+                    yield ": keep-alive\n\n"
+        finally:
+            self.subscribers -= 1
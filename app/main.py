@@ -1,18 +1,56 @@
 import datetime
-from fastapi import FastAPI, HTTPException, Depends, Query
+from contextlib import asynccontextmanager
+from typing import List, Optional
+import anyio
+from fastapi import FastAPI, HTTPException, Depends, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
+from app.admission import AdmissionPool
+from app.config import (INFERENCE_MAX_CONCURRENCY, INFERENCE_MAX_QUEUE_DEPTH,
+                        READ_POOL_SIZE, PROFILING_ENABLED)
 from app.models import Review
-from app.schemas import ReviewReport, ReviewResponse, ReviewCreate
+from app.schemas import (ReviewReport, ReviewResponse, ReviewCreate, PoolMetrics,
+                         SimilarReview)
 from sqlalchemy_pagination import paginate
-from app.db import SessionLocal
-from app.sentiment_analyze import analyze_sentiment
+from app.db import SessionLocal, engine
+from app.events import ReviewBroadcaster
+from app.profiling import instrument_app, instrument_engine, profiled, stage
+from app.embeddings import EmbeddingIndex, EmbeddingStore
+from app.sentiment_analyze import analyze_sentiment_and_embed, embed, embedding_dim
 from sqlalchemy.exc import SQLAlchemyError
 from app.create_db import reset_database
 import logging
 
-app = FastAPI()
 logger = logging.getLogger(__name__)
 
+# Pool dedicado à inferência, separado do pool padrão usado pelas leituras
+inference_pool = AdmissionPool("inference", INFERENCE_MAX_CONCURRENCY,
+                               INFERENCE_MAX_QUEUE_DEPTH)
+
+# Distribui as avaliações recém-criadas para os streams SSE
+broadcaster = ReviewBroadcaster()
+
+# Embeddings das avaliações para a busca semântica
+embedding_index = EmbeddingIndex(EmbeddingStore(embedding_dim))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    anyio.to_thread.current_default_thread_limiter().total_tokens = READ_POOL_SIZE
+    # Após reiniciar, o índice IVF é treinado de novo sem esperar a primeira busca
+    embedding_index.maybe_train()
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(broadcaster.publish_counts_periodically)
+        yield
+        tg.cancel_scope.cancel()
+
+
+app = FastAPI(lifespan=lifespan)
+
+if PROFILING_ENABLED:
+    instrument_engine(engine)
+    instrument_app(app)
+
 
 def get_db():
     db = SessionLocal()
@@ -23,8 +61,8 @@ def get_db():
 
 
 @app.post("/reviews", response_model=ReviewResponse)
-def create_review(review: ReviewCreate,
-                  db: Session = Depends(get_db)) -> ReviewResponse:
+async def create_review(review: ReviewCreate,
+                        db: Session = Depends(get_db)) -> ReviewResponse:
     """
     Cria uma nova avaliação.
 
@@ -39,23 +77,41 @@ def create_review(review: ReviewCreate,
          sentimento analisado.
 
     Raises:
-        SQLAlchemyError: Erros relacionados ao banco de dados podem ser levantados se a
-        operação falhar.
+        HTTPException: Exceção com código de status 429 e cabeçalho `Retry-After`
+        se a fila de inferência estiver cheia, ou 500 se a operação no banco de
+        dados falhar.
     """
+    new_review = ReviewResponse.from_orm(
+        await inference_pool.run(_create_review, review, db))
+    broadcaster.publish_review(new_review)
+    return new_review
+
+
+@profiled
+def _create_review(review: ReviewCreate, db: Session) -> Review:
     try:
+        with stage("model"):
+            sentiment, _, vector = analyze_sentiment_and_embed(review.review)
         new_review = Review(name=review.name, date=review.date, review=review.review,
-                            sentiment=analyze_sentiment(review.review)[0])
+                            sentiment=sentiment)
         db.add(new_review)
         db.commit()
         db.refresh(new_review)
-        return new_review
     except SQLAlchemyError as e:
         db.rollback()
         logger.error(f"Erro ao criar avaliação: {e}")
         raise HTTPException(status_code=500, detail="Erro ao criar avaliação")
+    # A avaliação já foi gravada: uma falha aqui não deve virar erro para o
+    # cliente, e o embedding pode ser recalculado com `create_embeddings`
+    try:
+        embedding_index.add(new_review.id, vector)
+    except Exception as e:
+        logger.error(f"Erro ao gravar embedding da avaliação {new_review.id}: {e}")
+    return new_review
 
 
 @app.get("/reviews", response_model=dict)
+@profiled
 def get_reviews(page: int = Query(1, ge=1), per_page: int = Query(10, ge=1),
                 db: Session = Depends(get_db)) -> dict:
     """
@@ -117,9 +173,11 @@ def get_reviews(page: int = Query(1, ge=1), per_page: int = Query(10, ge=1),
     """
     reviews_query = db.query(Review)
     paginated_reviews = paginate(reviews_query, page, per_page)
+    with stage("serialization"):
+        items = [ReviewResponse.from_orm(review)
+                 for review in paginated_reviews.items]
     return {
-        "items": [ReviewResponse.from_orm(review)
-                  for review in paginated_reviews.items],
+        "items": items,
         "total": paginated_reviews.total,
         "page": page,
         "total_pages": paginated_reviews.pages
@@ -127,6 +185,7 @@ def get_reviews(page: int = Query(1, ge=1), per_page: int = Query(10, ge=1),
 
 
 @app.get("/reviews/report", response_model=ReviewReport)
+@profiled
 def get_report(start_date: str, end_date: str,
                db: Session = Depends(get_db)) -> ReviewReport:
     """
@@ -182,7 +241,8 @@ def get_report(start_date: str, end_date: str,
         start = datetime.datetime.strptime(start_date, "%Y-%m-%d")
         end = datetime.datetime.strptime(end_date, "%Y-%m-%d")
         reviews = db.query(Review).filter(Review.date.between(start, end)).all()
-        review_items = [ReviewResponse.from_orm(review) for review in reviews]
+        with stage("serialization"):
+            review_items = [ReviewResponse.from_orm(review) for review in reviews]
         return {
             "reviews": review_items,
             "positiva": len([r for r in review_items if r.sentiment == "positiva"]),
@@ -194,7 +254,133 @@ def get_report(start_date: str, end_date: str,
         raise HTTPException(status_code=500, detail=f"Erro ao gerar relatório: {e}")
 
 
+@app.get("/reviews/stream")
+async def stream_reviews(request: Request,
+                         last_id: Optional[int] = Query(None, ge=0)
+                         ) -> StreamingResponse:
+    """
+    Transmite as novas avaliações via Server-Sent Events.
+
+    Cada avaliação criada é enviada como um evento `review`, com seu ID no campo
+    `id`, assim que é gravada no banco de dados. Periodicamente também é enviado
+    um evento `counts` com a variação da contagem de sentimentos desde o envio
+    anterior, dispensando a consulta repetida de `/reviews` e `/reviews/report`.
+
+    Args:
+        last_id (Optional[int]): ID da última avaliação recebida. As avaliações
+        posteriores são reenviadas do banco antes dos eventos novos. O cabeçalho
+        `Last-Event-ID`, enviado automaticamente pelo `EventSource` ao reconectar,
+        tem precedência e retoma exatamente a partir do último evento recebido.
+
+    Returns:
+        `StreamingResponse`: O stream `text/event-stream`.
+
+    Example:
+        ```bash
+        curl -N "http://127.0.0.1:8000/reviews/stream?last_id=10"
+        ```
+
+        Eventos esperados:
+        ```
+        id: 3f9a1c2e-42-11
+        event: review
+        data: {"id": 11, "name": "Ana Silva", ..., "sentiment": "neutra"}
+
+        id: 3f9a1c2e-43-11
+        event: counts
+        data: {"positiva": 0, "neutra": 1, "negativa": 0}
+        ```
+    """
+    last_event_id = request.headers.get("Last-Event-ID")
+    return StreamingResponse(broadcaster.stream(last_event_id, last_id,
+                                                _reviews_after),
+                             media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache",
+                                      "X-Accel-Buffering": "no"})
+
+
+def _reviews_after(last_id: int, limit: int) -> List[ReviewResponse]:
+    db = SessionLocal()
+    try:
+        reviews = (db.query(Review).filter(Review.id > last_id)
+                   .order_by(Review.id).limit(limit).all())
+        return [ReviewResponse.from_orm(review) for review in reviews]
+    finally:
+        db.close()
+
+
+@app.get("/reviews/search", response_model=List[SimilarReview])
+async def search_reviews(q: str = Query(..., min_length=1),
+                         k: int = Query(10, ge=1, le=100), exact: bool = False,
+                         db: Session = Depends(get_db)) -> List[SimilarReview]:
+    """
+    Busca as avaliações com significado mais próximo do texto informado.
+
+    O texto é convertido em embedding pelo mesmo encoder BERT usado na análise de
+    sentimento (passando pela fila de inferência) e comparado com os embeddings
+    das avaliações gravadas.
+
+    Args:
+        q (str): O texto de busca, por exemplo "demora no atendimento".
+        k (int): Número máximo de avaliações retornadas.
+        exact (bool): Força a busca exata em vez do índice aproximado.
+
+    Returns:
+        List[`SimilarReview`]: As avaliações encontradas com a similaridade de
+        cada uma, em ordem decrescente.
+
+    Raises:
+        HTTPException: Exceção com código de status 429 se a fila de inferência
+        estiver cheia.
+
+    Example:
+        ```bash
+        curl "http://127.0.0.1:8000/reviews/search?q=demora%20no%20atendimento&k=5"
+        ```
+    """
+    vector = await inference_pool.run(embed, q)
+    return await anyio.to_thread.run_sync(_find_similar, vector, k, exact, None, db)
+
+
+@app.get("/reviews/{id}/similar", response_model=List[SimilarReview])
+@profiled
+def get_similar_reviews(id: int, k: int = Query(10, ge=1, le=100),
+                        exact: bool = False,
+                        db: Session = Depends(get_db)) -> List[SimilarReview]:
+    """
+    Obtém as avaliações com significado mais próximo de uma avaliação.
+
+    Args:
+        id (int): O ID da avaliação de referência.
+        k (int): Número máximo de avaliações retornadas.
+        exact (bool): Força a busca exata em vez do índice aproximado.
+
+    Returns:
+        List[`SimilarReview`]: As avaliações encontradas com a similaridade de
+        cada uma, em ordem decrescente, sem incluir a própria avaliação.
+
+    Raises:
+        HTTPException: Exceção com código de status 404 se a avaliação ou o seu
+        embedding não forem encontrados.
+    """
+    vector = embedding_index.get(id)
+    if vector is None:
+        raise HTTPException(status_code=404, detail="Review not found")
+    return _find_similar(vector, k, exact, id, db)
+
+
+def _find_similar(vector, k: int, exact: bool, exclude: Optional[int],
+                  db: Session) -> List[SimilarReview]:
+    results = embedding_index.search(vector, k, exact=exact, exclude=exclude)
+    reviews = {review.id: review for review in
+               db.query(Review).filter(Review.id.in_([i for i, _ in results]))}
+    with stage("serialization"):
+        return [SimilarReview(review=ReviewResponse.from_orm(reviews[i]), score=score)
+                for i, score in results if i in reviews]
+
+
 @app.get("/reviews/{id}", response_model=ReviewResponse)
+@profiled
 def get_review(id: int, db: Session = Depends(get_db)) -> ReviewResponse:
     """
     Obtém uma avaliação pelo ID.
@@ -218,7 +404,33 @@ def get_review(id: int, db: Session = Depends(get_db)) -> ReviewResponse:
     return review
 
 
+@app.get("/metrics", response_model=List[PoolMetrics])
+async def get_metrics() -> List[PoolMetrics]:
+    """
+    Retorna as métricas dos pools de capacidade.
+
+    Inclui a fila de inferência (em andamento, profundidade da fila, admitidas e
+    rejeitadas com 429) e a ocupação do pool de threads das leituras.
+
+    Returns:
+        List[`PoolMetrics`]: As métricas de cada pool.
+    """
+    # Precisa rodar no event loop: fora dele o limiter padrão não é acessível
+    read_limiter = anyio.to_thread.current_default_thread_limiter()
+    read_stats = read_limiter.statistics()
+    return [
+        inference_pool.metrics(),
+        {
+            "name": "read",
+            "max_concurrency": int(read_limiter.total_tokens),
+            "in_flight": read_stats.borrowed_tokens,
+            "queue_depth": read_stats.tasks_waiting,
+        },
+    ]
+
+
 @app.get("/reset")
 def get_rest():
     reset_database()
+    embedding_index.clear()
     return "Sucess"
@@ -0,0 +1,328 @@
+import functools
+import hmac
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import anyio
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+from app.config import (PROFILING_DIR, PROFILING_ENABLED, PROFILING_INTERVAL,
+                        PROFILING_SAMPLE_RATE, PROFILING_TOKEN)
+
+_current_profile: ContextVar[Optional["RequestProfile"]] = ContextVar(
+    "current_profile", default=None)
+_NO_STAGE = nullcontext()
+logger = logging.getLogger(__name__)
+
+
+class RequestProfile:
+    """Perfil de uma única requisição.
+
+    Uma thread de amostragem coleta periodicamente a pilha das threads que estão
+    executando a requisição. Cada amostra é prefixada pela etapa em andamento
+    (`db`, `serialization`, `model` ou `other`) e o tempo de cada etapa é somado
+    separadamente.
+
+    Attributes:
+        name (str): Identificação da requisição (método e caminho).
+        stages (Dict[str, float]): Tempo acumulado em segundos por etapa.
+        samples (Counter): Contagem de amostras por pilha.
+    """
+
+    def __init__(self, name: str, interval: float = PROFILING_INTERVAL):
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.interval = interval
+        self.stages: Dict[str, float] = defaultdict(float)
+        self.samples: Counter = Counter()
+        self.duration = 0.0
+        self._threads: Dict[int, List[str]] = {}
+        self._stage_only: Set[int] = set()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample_loop, daemon=True)
+        self._start = 0.0
+
+    def start(self):
+        self._start = time.perf_counter()
+        self._sampler.start()
+
+    def stop(self):
+        """Encerra a medição sem bloquear; a thread de amostragem para sozinha."""
+        self._stop.set()
+        self.duration = time.perf_counter() - self._start
+
+    def finish(self, directory: Optional[str] = None) -> str:
+        """Aguarda a thread de amostragem e grava os arquivos do perfil.
+
+        Bloqueante: deve rodar fora do event loop.
+        """
+        self._sampler.join()
+        return self.write(directory)
+
+    @contextmanager
+    def attach(self, stage_only: bool = False):
+        """Inclui a thread atual na amostragem enquanto o bloco executa.
+
+        Com `stage_only` a thread só é amostrada dentro de uma etapa, o que evita
+        contar como desta requisição o tempo ocioso ou de outras requisições do
+        event loop.
+        """
+        tid = threading.get_ident()
+        self._threads.setdefault(tid, [])
+        if stage_only:
+            self._stage_only.add(tid)
+        try:
+            yield
+        finally:
+            self._threads.pop(tid, None)
+            self._stage_only.discard(tid)
+
+    def enter_stage(self, name: str):
+        stack = self._threads.get(threading.get_ident())
+        if stack is not None:
+            stack.append(name)
+
+    def exit_stage(self, name: str, elapsed: float):
+        stack = self._threads.get(threading.get_ident())
+        if stack:
+            stack.pop()
+        self.stages[name] += elapsed
+
+    def _sample_loop(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for tid, stage_stack in list(self._threads.items()):
+                frame = frames.get(tid)
+                if frame is None:
+                    continue
+                if not stage_stack and tid in self._stage_only:
+                    continue
+                stage = stage_stack[-1] if stage_stack else "other"
+                self.samples[(f"[{stage}]",) + _frame_stack(frame)] += 1
+
+    def server_timing(self) -> str:
+        """Formata as etapas para o cabeçalho `Server-Timing`."""
+        parts = [f"{name};dur={seconds * 1000:.1f}"
+                 for name, seconds in sorted(self.stages.items())]
+        parts.append(f"total;dur={self.duration * 1000:.1f}")
+        return ", ".join(parts)
+
+    def collapsed(self) -> str:
+        """Exporta as amostras no formato de pilhas colapsadas (flamegraph.pl)."""
+        return "".join(f"{';'.join(stack)} {count}\n"
+                       for stack, count in self.samples.most_common())
+
+    def speedscope(self) -> dict:
+        """Exporta as amostras no formato de arquivo do speedscope."""
+        frame_index: Dict[str, int] = {}
+        samples, weights = [], []
+        for stack, count in self.samples.items():
+            samples.append([frame_index.setdefault(f, len(frame_index))
+                            for f in stack])
+            weights.append(count * self.interval)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": self.name,
+            "exporter": "OrganIA",
+            "shared": {"frames": [{"name": f} for f in frame_index]},
+            "profiles": [{
+                "type": "sampled",
+                "name": f"{self.name} ({self.server_timing()})",
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            }],
+        }
+
+    def write(self, directory: Optional[str] = None) -> str:
+        """Grava os arquivos `.collapsed` e `.speedscope.json` no diretório.
+
+        Args:
+            directory (Optional[str]): Diretório de destino (padrão
+            `PROFILING_DIR`).
+
+        Returns:
+            str: O caminho base dos arquivos gravados, sem extensão.
+        """
+        directory = directory or PROFILING_DIR
+        os.makedirs(directory, exist_ok=True)
+        slug = "".join(c if c.isalnum() else "_" for c in self.name).strip("_")
+        base = os.path.join(directory,
+                            f"{time.strftime('%Y%m%d-%H%M%S')}-{slug}-{self.id}")
+        with open(f"{base}.collapsed", "w", encoding="utf-8") as f:
+            f.write(self.collapsed())
+        with open(f"{base}.speedscope.json", "w", encoding="utf-8") as f:
+            json.dump(self.speedscope(), f)
+        return base
+
+
+def _frame_stack(frame) -> Tuple[str, ...]:
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:"
+                     f"{frame.f_lineno})")
+        frame = frame.f_back
+    return tuple(reversed(stack))
+
+
+def set_current_profile(profile: Optional[RequestProfile]):
+    return _current_profile.set(profile)
+
+
+def reset_current_profile(token):
+    _current_profile.reset(token)
+
+
+def should_profile(profile_header: Optional[str]) -> bool:
+    """Decide se a requisição deve ser perfilada.
+
+    A requisição é perfilada se o cabeçalho `X-Profile` contém o token
+    configurado ou se for sorteada pela taxa de amostragem.
+    """
+    if not PROFILING_ENABLED:
+        return False
+    if PROFILING_TOKEN and profile_header is not None:
+        if hmac.compare_digest(profile_header.encode(), PROFILING_TOKEN.encode()):
+            return True
+    return PROFILING_SAMPLE_RATE > 0 and random.random() < PROFILING_SAMPLE_RATE
+
+
+@contextmanager
+def _timed_stage(profile: RequestProfile, name: str):
+    profile.enter_stage(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.exit_stage(name, time.perf_counter() - start)
+
+
+def stage(name: str):
+    """Marca um bloco como uma etapa (`db`, `serialization`, `model`).
+
+    Sem perfil ativo retorna um contexto vazio, com custo desprezível.
+    """
+    profile = _current_profile.get()
+    if profile is None:
+        return _NO_STAGE
+    return _timed_stage(profile, name)
+
+
+def profiled(func: Callable) -> Callable:
+    """Inclui a thread que executa `func` na amostragem do perfil ativo.
+
+    Com o perfilamento desativado a função é retornada sem alterações.
+    """
+    if not PROFILING_ENABLED:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profile = _current_profile.get()
+        if profile is None:
+            return func(*args, **kwargs)
+        with profile.attach():
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+class ProfiledJSONResponse(JSONResponse):
+    """`JSONResponse` que mede a renderização do JSON na etapa `serialization`."""
+
+    def render(self, content) -> bytes:
+        with stage("serialization"):
+            return super().render(content)
+
+
+def instrument_app(app):
+    """Instala o perfilamento sob demanda na aplicação.
+
+    Deve ser chamada antes da declaração das rotas, para que elas usem
+    `ProfiledJSONResponse`. A validação e serialização do `response_model` feita
+    pelo FastAPI também entra na etapa `serialization`: em requisições perfiladas
+    ela roda no event loop, que é amostrado durante as etapas, em vez de uma
+    thread à parte que não seria amostrada.
+    """
+    import fastapi.routing
+
+    original = fastapi.routing.serialize_response
+
+    async def serialize_response(**kwargs):
+        if _current_profile.get() is None:
+            return await original(**kwargs)
+        with stage("serialization"):
+            return await original(**{**kwargs, "is_coroutine": True})
+
+    fastapi.routing.serialize_response = serialize_response
+    app.router.default_response_class = ProfiledJSONResponse
+    app.middleware("http")(profile_request)
+
+
+async def profile_request(request: Request, call_next):
+    """
+    Perfila a requisição se o cabeçalho `X-Profile` contém o token configurado
+    ou se ela for sorteada pela taxa de amostragem.
+
+    O tempo por etapa é retornado no cabeçalho `Server-Timing` e os arquivos
+    speedscope/collapsed são gravados em `PROFILING_DIR`, identificados pelo
+    cabeçalho `X-Profile-Id`.
+    """
+    if not should_profile(request.headers.get("X-Profile")):
+        return await call_next(request)
+    profile = RequestProfile(f"{request.method} {request.url.path}")
+    token = set_current_profile(profile)
+    profile.start()
+    try:
+        with profile.attach(stage_only=True):
+            response = await call_next(request)
+    finally:
+        profile.stop()
+        reset_current_profile(token)
+    path = await anyio.to_thread.run_sync(profile.finish)
+    logger.info(f"Perfil de {profile.name} gravado em {path}: "
+                f"{profile.server_timing()}")
+    response.headers["Server-Timing"] = profile.server_timing()
+    response.headers["X-Profile-Id"] = profile.id
+    return response
+
+
+def instrument_engine(engine):
+    """Soma o tempo das queries do SQLAlchemy na etapa `db` do perfil ativo."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        profile = _current_profile.get()
+        if profile is not None:
+            profile.enter_stage("db")
+            conn.info.setdefault("profile_start", []).append(time.perf_counter())
+
+    def _finish(conn):
+        profile = _current_profile.get()
+        starts = conn.info.get("profile_start")
+        if profile is not None and starts:
+            profile.exit_stage("db", time.perf_counter() - starts.pop())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        _finish(conn)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        if exception_context.connection is not None:
+            _finish(exception_context.connection)
@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from datetime import date
-from typing import List
+from typing import List, Optional
 # Modelo para criar uma nova avaliação (input)
 
 
@@ -54,3 +54,36 @@ class ReviewReport(BaseModel):
     positiva: int
     neutra: int
     negativa: int
+
+
+class SimilarReview(BaseModel):
+    """Modelo de dados para uma avaliação retornada pela busca semântica.
+
+    Attributes:
+        review (ReviewResponse): A avaliação encontrada.
+        score (float): Similaridade cosseno com a consulta (de -1 a 1).
+    """
+    review: ReviewResponse
+    score: float
+
+
+class PoolMetrics(BaseModel):
+    """Modelo de dados com as métricas de um pool de capacidade.
+
+    Attributes:
+        name (str): Nome do pool ('inference' ou 'read').
+        max_concurrency (int): Número máximo de execuções simultâneas.
+        max_queue_depth (Optional[int]): Tamanho máximo da fila antes de rejeitar
+        requisições com 429 (`None` se o pool não rejeita).
+        in_flight (int): Execuções em andamento.
+        queue_depth (int): Requisições aguardando na fila.
+        admitted (int): Total de requisições admitidas.
+        rejected (int): Total de requisições rejeitadas com 429.
+    """
+    name: str
+    max_concurrency: int
+    max_queue_depth: Optional[int] = None
+    in_flight: int
+    queue_depth: int
+    admitted: int = 0
+    rejected: int = 0
@@ -1,3 +1,5 @@
+import numpy as np
+import torch
 from transformers import pipeline
 from textblob import TextBlob
 # from googletrans import Translator
@@ -13,9 +15,64 @@ en_to_pt = {
 
 
 def analyze_sentiment(text):
-    results = sentiment_analysis(text)
-    sentiment = results[0]
-    return classify_sentiment(int(sentiment['label'][0])), sentiment['score']
+    return _classify(_encode(text)[1])
+
+
+# O encoder é chamado diretamente, sem o pipeline, então garante o modo de
+# inferência (sem dropout)
+sentiment_analysis.model.eval()
+
+# Dimensão dos embeddings gerados pelo encoder BERT do pipeline
+embedding_dim = sentiment_analysis.model.config.hidden_size
+
+
+def embed(text):
+    """Gera o embedding do texto com o encoder BERT já carregado no pipeline.
+
+    Usa a média dos estados da última camada, ponderada pela máscara de atenção,
+    normalizada para norma 1 (o produto interno equivale à similaridade cosseno).
+    """
+    return _pool(*_encode(text))
+
+
+def analyze_sentiment_and_embed(text):
+    """Classifica o sentimento e gera o embedding com uma única passada do BERT.
+
+    A saída do encoder é reaproveitada: o `pooler_output` vai para a camada de
+    classificação do modelo, como faz o pipeline, e os estados da última camada
+    geram o embedding.
+
+    Returns:
+        tuple: O sentimento, a confiança da classificação e o embedding.
+    """
+    inputs, outputs = _encode(text)
+    sentiment, score = _classify(outputs)
+    return sentiment, score, _pool(inputs, outputs)
+
+
+def _encode(text):
+    inputs = sentiment_analysis.tokenizer(text, truncation=True,
+                                          return_tensors="pt")
+    with torch.no_grad():
+        outputs = sentiment_analysis.model.base_model(**inputs)
+    return inputs, outputs
+
+
+def _classify(outputs):
+    model = sentiment_analysis.model
+    with torch.no_grad():
+        logits = model.classifier(model.dropout(outputs.pooler_output))
+    probabilities = logits.softmax(dim=-1)[0]
+    best = int(probabilities.argmax())
+    label = model.config.id2label[best]
+    return classify_sentiment(int(label[0])), float(probabilities[best])
+
+
+def _pool(inputs, outputs):
+    hidden = outputs.last_hidden_state
+    mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+    vector = ((hidden * mask).sum(dim=1) / mask.sum(dim=1))[0].numpy()
+    return (vector / np.linalg.norm(vector)).astype(np.float32)
 
 
 def classify_sentiment(star):
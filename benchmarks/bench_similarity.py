@@ -0,0 +1,77 @@
+"""Mede a latência das consultas de similaridade em função do tamanho do corpus.
+
+Usa embeddings aleatórios com a dimensão do BERT (768), sem carregar o modelo,
+e compara a busca exata com o índice IVF, incluindo o recall@10 do IVF em
+relação à busca exata.
+
+Uso:
+    python -m benchmarks.bench_similarity [--sizes 1000 10000 100000]
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from app.embeddings import EmbeddingIndex, EmbeddingStore
+
+
+def clustered_vectors(count, dim, rng, clusters=200):
+    # Embeddings reais formam grupos; vetores uniformes seriam o pior caso do IVF
+    centers = rng.normal(size=(clusters, dim))
+    vectors = (centers[rng.integers(clusters, size=count)]
+               + 0.5 * rng.normal(size=(count, dim)))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(
+        np.float32)
+
+
+def bench(size, dim, queries, nprobe, rng):
+    with tempfile.TemporaryDirectory() as directory:
+        store = EmbeddingStore(dim, directory, initial_capacity=size + 1)
+        index = EmbeddingIndex(store, nprobe=nprobe, ivf_min_size=0)
+        vectors = clustered_vectors(size + queries, dim, rng)
+        for review_id, vector in enumerate(vectors[:size], start=1):
+            index.store.put(review_id, vector)
+
+        start = time.perf_counter()
+        index.maybe_train()
+        index.wait_for_training()
+        train = time.perf_counter() - start
+
+        timings = {"exact": [], "ivf": []}
+        recall = []
+        for query in vectors[size:]:
+            start = time.perf_counter()
+            exact = index.search(query, k=10, exact=True)
+            timings["exact"].append(time.perf_counter() - start)
+            start = time.perf_counter()
+            approximate = index.search(query, k=10)
+            timings["ivf"].append(time.perf_counter() - start)
+            recall.append(len({r for r, _ in exact} & {r for r, _ in approximate})
+                          / len(exact))
+        return train, timings, float(np.mean(recall))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[1000, 10000, 100000])
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--nprobe", type=int, default=8)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'corpus':>8} {'treino (s)':>11} {'exata p50':>10} {'exata p99':>10} "
+          f"{'ivf p50':>9} {'ivf p99':>9} {'recall@10':>10}")
+    for size in args.sizes:
+        train, timings, recall = bench(size, args.dim, args.queries, args.nprobe,
+                                       rng)
+        exact = np.percentile(timings["exact"], [50, 99]) * 1000
+        ivf = np.percentile(timings["ivf"], [50, 99]) * 1000
+        print(f"{size:>8} {train:>11.2f} {exact[0]:>8.2f}ms {exact[1]:>8.2f}ms "
+              f"{ivf[0]:>7.2f}ms {ivf[1]:>7.2f}ms {recall:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
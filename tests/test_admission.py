@@ -0,0 +1,89 @@
+import threading
+import anyio
+import pytest
+from fastapi import HTTPException
+from app.admission import AdmissionPool
+
+
+@pytest.mark.anyio
+async def test_admission_pool_rejects_when_queue_full():
+    pool = AdmissionPool("test", max_concurrency=1, max_queue_depth=0)
+    release = threading.Event()
+
+    async def hold():
+        await pool.run(release.wait)
+
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(hold)
+        while pool.in_flight == 0:
+            await anyio.sleep(0.01)
+
+        with pytest.raises(HTTPException) as exc_info:
+            await pool.run(lambda: None)
+        assert exc_info.value.status_code == 429
+        assert int(exc_info.value.headers["Retry-After"]) >= 1
+        release.set()
+
+    metrics = pool.metrics()
+    assert metrics["admitted"] == 1
+    assert metrics["rejected"] == 1
+    assert metrics["in_flight"] == 0
+
+
+@pytest.mark.anyio
+async def test_admission_pool_queues_within_depth():
+    pool = AdmissionPool("test", max_concurrency=1, max_queue_depth=1)
+    release = threading.Event()
+    results = []
+
+    async def work(value):
+        results.append(await pool.run(lambda: release.wait() and value))
+
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(work, 1)
+        while pool.in_flight == 0:
+            await anyio.sleep(0.01)
+        tg.start_soon(work, 2)
+        while pool.queue_depth == 0:
+            await anyio.sleep(0.01)
+
+        with pytest.raises(HTTPException):
+            await pool.run(lambda: None)
+        release.set()
+
+    assert sorted(results) == [1, 2]
+    assert pool.metrics()["rejected"] == 1
+
+
+@pytest.mark.anyio
+async def test_admission_pool_bounds_simultaneous_burst():
+    pool = AdmissionPool("test", max_concurrency=1, max_queue_depth=2)
+    release = threading.Event()
+    outcomes = []
+
+    async def request():
+        try:
+            await pool.run(release.wait)
+            outcomes.append(200)
+        except HTTPException as e:
+            outcomes.append(e.status_code)
+
+    async with anyio.create_task_group() as tg:
+        for _ in range(50):
+            tg.start_soon(request)
+        try:
+            with anyio.fail_after(2):
+                while pool.in_flight == 0 or len(outcomes) < 47:
+                    await anyio.sleep(0.01)
+            assert pool.queue_depth == 2
+        finally:
+            release.set()
+
+    assert outcomes.count(429) == 47
+    assert outcomes.count(200) == 3
+    assert pool.metrics()["rejected"] == 47
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
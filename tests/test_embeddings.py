@@ -0,0 +1,113 @@
+import threading
+import numpy as np
+from app.embeddings import EmbeddingIndex, EmbeddingStore
+
+
+def random_vectors(count, dim=32, seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(count, dim))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(
+        np.float32)
+
+
+def test_exact_search_returns_nearest(tmp_path):
+    vectors = random_vectors(50)
+    index = EmbeddingIndex(EmbeddingStore(32, str(tmp_path), initial_capacity=8))
+    for review_id, vector in enumerate(vectors, start=1):
+        index.add(review_id, vector)
+
+    results = index.search(vectors[9], k=3)
+    assert results[0][0] == 10
+    assert results[0][1] > 0.99
+    assert len(results) == 3
+    assert [r for r, _ in index.search(vectors[9], k=3, exclude=10)][0] != 10
+
+
+def test_store_persists_and_grows(tmp_path):
+    vectors = random_vectors(20)
+    store = EmbeddingStore(32, str(tmp_path), initial_capacity=4)
+    for review_id, vector in enumerate(vectors, start=1):
+        store.put(review_id, vector)
+    store.flush()
+    assert store.capacity >= 21
+
+    reopened = EmbeddingStore(32, str(tmp_path))
+    assert reopened.ids().tolist() == list(range(1, 21))
+    np.testing.assert_allclose(reopened.vectors[5], vectors[4], atol=1e-3)
+
+
+def test_ivf_search_matches_exact_and_accepts_inserts(tmp_path):
+    vectors = random_vectors(2000)
+    index = EmbeddingIndex(EmbeddingStore(32, str(tmp_path)), nprobe=16,
+                           ivf_min_size=100)
+    for review_id, vector in enumerate(vectors[:1500], start=1):
+        index.add(review_id, vector)
+    assert index.maybe_train()
+    assert index.wait_for_training(5)
+
+    query = vectors[42]
+    assert index.search(query, k=1)[0][0] == 43
+
+    for review_id, vector in enumerate(vectors[1500:], start=1501):
+        index.add(review_id, vector)
+    assert index.search(vectors[1800], k=1)[0][0] == 1801
+
+    exact = {r for r, _ in index.search(query, k=10, exact=True)}
+    approximate = {r for r, _ in index.search(query, k=10)}
+    assert len(exact & approximate) >= 5
+
+
+def test_clear_removes_all_vectors(tmp_path):
+    index = EmbeddingIndex(EmbeddingStore(32, str(tmp_path)))
+    index.add(1, random_vectors(1)[0])
+    index.clear()
+    assert len(index) == 0
+    assert index.search(random_vectors(1)[0]) == []
+
+
+def test_training_runs_in_the_background(tmp_path):
+    started, release = threading.Event(), threading.Event()
+
+    class SlowIndex(EmbeddingIndex):
+        def _build(self, ids, vectors, iterations=10):
+            started.set()
+            release.wait(5)
+            return super()._build(ids, vectors, iterations)
+
+    vectors = random_vectors(300)
+    index = SlowIndex(EmbeddingStore(32, str(tmp_path)), nprobe=64, ivf_min_size=100)
+    for review_id, vector in enumerate(vectors[:200], start=1):
+        index.add(review_id, vector)
+
+    # A busca que dispara o treino não espera o k-means: responde com a busca
+    # exata, assim como inserções e as buscas seguintes
+    assert index.search(vectors[0], k=1)[0][0] == 1
+    assert started.wait(5)
+    index.add(201, vectors[200])
+    assert index.search(vectors[200], k=1)[0][0] == 201
+
+    release.set()
+    assert index.wait_for_training(5)
+    # O embedding inserido durante o treino entra nas novas listas do IVF
+    assert index._centroids is not None
+    assert index.search(vectors[200], k=1)[0][0] == 201
+
+
+def test_ivf_search_sees_store_growth_after_snapshot(tmp_path):
+    vectors = random_vectors(201)
+
+    class GrowingIndex(EmbeddingIndex):
+        def _ivf_candidates(self, vector):
+            # Outra requisição insere um ID fora da capacidade atual entre o
+            # snapshot de `search` e a leitura das listas
+            if self.store.capacity <= 200:
+                self.add(200, vectors[200])
+            return super()._ivf_candidates(vector)
+
+    index = GrowingIndex(EmbeddingStore(32, str(tmp_path), initial_capacity=200),
+                         nprobe=64, ivf_min_size=100)
+    for review_id, vector in enumerate(vectors[:199], start=1):
+        index.add(review_id, vector)
+    index.maybe_train()
+    assert index.wait_for_training(5)
+
+    assert index.search(vectors[200], k=1)[0][0] == 200
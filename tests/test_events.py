@@ -0,0 +1,166 @@
+import datetime
+import json
+import anyio
+import pytest
+from app.events import ReviewBroadcaster
+from app.schemas import ReviewResponse
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+def make_review(review_id, sentiment="positiva"):
+    return ReviewResponse(id=review_id, name="Ana Silva",
+                          date=datetime.date(2024, 8, 7),
+                          review="O atendimento foi rápido.", sentiment=sentiment)
+
+
+def no_backfill(last_id, limit):
+    raise AssertionError("backfill não deveria ser chamado")
+
+
+def field(event, name):
+    return next(line.split(": ", 1)[1] for line in event.splitlines()
+                if line.startswith(f"{name}: "))
+
+
+def review_ids(events):
+    return [json.loads(field(e, "data"))["id"] for e in events
+            if field(e, "event") == "review"]
+
+
+async def subscribe_and_publish(broadcaster, review_ids):
+    stream = broadcaster.stream(None, None, no_backfill)
+    await stream.__anext__()  # retry
+    for review_id in review_ids:
+        broadcaster.publish_review(make_review(review_id))
+    return await take(stream, len(review_ids))
+
+
+async def take(stream, count):
+    events = []
+    with anyio.fail_after(2):
+        async for chunk in stream:
+            if chunk.startswith(("retry:", ":")):
+                continue
+            events.append(chunk)
+            if len(events) == count:
+                break
+    await stream.aclose()
+    return events
+
+
+@pytest.mark.anyio
+async def test_broadcaster_pushes_reviews_and_counts():
+    broadcaster = ReviewBroadcaster()
+    stream = broadcaster.stream(None, None, no_backfill)
+    await stream.__anext__()  # retry
+
+    async def publish():
+        broadcaster.publish_review(make_review(1, "positiva"))
+        broadcaster.publish_review(make_review(2, "negativa"))
+        broadcaster.flush_counts()
+
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(publish)
+        events = await take(stream, 3)
+
+    assert review_ids(events) == [1, 2]
+    assert field(events[2], "event") == "counts"
+    data = json.loads(field(events[2], "data"))
+    assert data == {"positiva": 1, "neutra": 0, "negativa": 1}
+    assert broadcaster.subscribers == 0
+
+
+@pytest.mark.anyio
+async def test_broadcaster_resumes_from_buffer_with_out_of_order_publishes():
+    broadcaster = ReviewBroadcaster()
+    events = await subscribe_and_publish(broadcaster, [1, 3])
+    last_event_id = field(events[-1], "id")
+
+    # A avaliação 2 termina a inferência depois da 3
+    broadcaster.publish_review(make_review(2))
+    broadcaster.flush_counts()
+
+    resumed = await take(broadcaster.stream(last_event_id, None, no_backfill), 2)
+    assert review_ids(resumed) == [2]
+    assert field(resumed[1], "event") == "counts"
+
+
+@pytest.mark.anyio
+async def test_broadcaster_resumes_from_database_when_buffer_is_too_short():
+    broadcaster = ReviewBroadcaster(history_size=2)
+    events = await subscribe_and_publish(broadcaster, [1])
+    last_event_id = field(events[0], "id")
+    for review_id in (2, 3, 4):
+        broadcaster.publish_review(make_review(review_id))
+
+    calls = []
+
+    def backfill(last_id, limit):
+        calls.append(last_id)
+        return [make_review(review_id) for review_id in (2, 3, 4)
+                if review_id > last_id]
+
+    resumed = await take(broadcaster.stream(last_event_id, None, backfill), 3)
+    assert calls == [1]
+    assert review_ids(resumed) == [2, 3, 4]
+
+
+@pytest.mark.anyio
+async def test_broadcaster_ignores_event_id_from_another_process():
+    # Processo recém-reiniciado: nada publicado, mas o banco tem a avaliação 1
+    broadcaster = ReviewBroadcaster()
+    calls = []
+
+    def backfill(last_id, limit):
+        calls.append(last_id)
+        return [make_review(1)]
+
+    resumed = await take(broadcaster.stream("deadbeef-1-0", None, backfill), 1)
+    assert calls == [0]
+    assert review_ids(resumed) == [1]
+
+
+def backfill_from(review_ids, calls):
+    def backfill(last_id, limit):
+        calls.append(last_id)
+        return [make_review(i) for i in review_ids if i > last_id][:limit]
+    return backfill
+
+
+@pytest.mark.anyio
+async def test_broadcaster_pages_database_backfill():
+    broadcaster = ReviewBroadcaster(history_size=2)
+    missed = list(range(1, 26))
+    for review_id in missed:
+        broadcaster.publish_review(make_review(review_id))
+
+    calls = []
+    stream = broadcaster.stream("deadbeef-1-0", None, backfill_from(missed, calls),
+                                backfill_page=10)
+    resumed = await take(stream, 25)
+    assert calls == [0, 10, 20]
+    assert review_ids(resumed) == missed
+
+
+@pytest.mark.anyio
+async def test_broadcaster_reconnect_during_backfill_resumes_from_database():
+    broadcaster = ReviewBroadcaster(history_size=2)
+    missed = list(range(1, 26))
+    for review_id in missed:
+        broadcaster.publish_review(make_review(review_id))
+
+    calls = []
+    stream = broadcaster.stream("deadbeef-1-0", None, backfill_from(missed, calls),
+                                backfill_page=10)
+    first = await take(stream, 5)
+    assert review_ids(first) == [1, 2, 3, 4, 5]
+
+    stream = broadcaster.stream(field(first[-1], "id"), None,
+                                backfill_from(missed, calls), backfill_page=10)
+    resumed = await take(stream, 20)
+    assert calls == [0, 5, 15]
+    assert review_ids(resumed) == missed[5:]
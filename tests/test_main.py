@@ -259,3 +259,13 @@ def test_reset_database(client_fixture):
     data = get_response.json()
     assert data["total"] == 0
     assert len(data["items"]) == 0
+
+
+def test_get_metrics(client_fixture):
+    response = client_fixture.get("/metrics")
+    assert response.status_code == 200
+    pools = {pool["name"]: pool for pool in response.json()}
+    assert set(pools) == {"inference", "read"}
+    assert pools["inference"]["rejected"] >= 0
+    assert pools["inference"]["queue_depth"] >= 0
+    assert pools["read"]["max_concurrency"] >= 1
@@ -0,0 +1,104 @@
+import json
+import os
+import time
+from typing import List
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+from app import profiling
+from app.profiling import (RequestProfile, reset_current_profile,
+                           set_current_profile, stage)
+
+
+def busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_request_profile_stages_and_output(tmp_path):
+    profile = RequestProfile("GET /reviews/report", interval=0.001)
+    token = set_current_profile(profile)
+    profile.start()
+    try:
+        with profile.attach():
+            with stage("model"):
+                busy(0.05)
+            with stage("serialization"):
+                busy(0.02)
+    finally:
+        profile.stop()
+        reset_current_profile(token)
+
+    assert profile.stages["model"] >= 0.05
+    assert profile.stages["serialization"] >= 0.02
+    assert "model;dur=" in profile.server_timing()
+    assert any(stack[0] == "[model]" for stack in profile.samples)
+
+    base = profile.finish(str(tmp_path))
+    collapsed = open(f"{base}.collapsed", encoding="utf-8").read()
+    assert "busy (test_profiling.py" in collapsed
+    with open(f"{base}.speedscope.json", encoding="utf-8") as f:
+        speedscope = json.load(f)
+    assert speedscope["profiles"][0]["type"] == "sampled"
+    assert len(speedscope["profiles"][0]["samples"]) == len(profile.samples)
+
+
+def test_stage_without_profile_is_noop():
+    with stage("db"):
+        pass
+
+
+def test_should_profile(monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILING_ENABLED", True)
+    monkeypatch.setattr(profiling, "PROFILING_TOKEN", "segredo")
+    monkeypatch.setattr(profiling, "PROFILING_SAMPLE_RATE", 0.0)
+    assert profiling.should_profile("segredo")
+    assert not profiling.should_profile("errado")
+    assert not profiling.should_profile(None)
+
+    # Sem token configurado nenhum cabeçalho ativa o perfil
+    monkeypatch.setattr(profiling, "PROFILING_TOKEN", "")
+    assert not profiling.should_profile("")
+
+    monkeypatch.setattr(profiling, "PROFILING_SAMPLE_RATE", 1.0)
+    assert profiling.should_profile(None)
+
+    monkeypatch.setattr(profiling, "PROFILING_ENABLED", False)
+    assert not profiling.should_profile(None)
+
+
+def test_profile_middleware_headers_and_serialization_stage(monkeypatch, tmp_path):
+    monkeypatch.setattr(profiling, "PROFILING_ENABLED", True)
+    monkeypatch.setattr(profiling, "PROFILING_TOKEN", "segredo")
+    monkeypatch.setattr(profiling, "PROFILING_SAMPLE_RATE", 0.0)
+    monkeypatch.setattr(profiling, "PROFILING_DIR", str(tmp_path))
+
+    class Item(BaseModel):
+        value: int
+
+    app = FastAPI()
+    profiling.instrument_app(app)
+
+    @app.get("/items", response_model=List[Item])
+    @profiling.profiled
+    def get_items():
+        with stage("db"):
+            busy(0.01)
+        return [{"value": i} for i in range(20000)]
+
+    client = TestClient(app)
+    response = client.get("/items", headers={"X-Profile": "segredo"})
+    assert response.status_code == 200
+    assert len(response.json()) == 20000
+    timings = dict(part.split(";dur=")
+                   for part in response.headers["Server-Timing"].split(", "))
+    assert float(timings["db"]) >= 10
+    assert float(timings["serialization"]) > 0
+    profile_id = response.headers["X-Profile-Id"]
+    collapsed = [f for f in os.listdir(tmp_path) if f.endswith(".collapsed")]
+    assert len(collapsed) == 1 and profile_id in collapsed[0]
+
+    response = client.get("/items")
+    assert "Server-Timing" not in response.headers
+    assert "X-Profile-Id" not in response.headers